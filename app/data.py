@@ -1,10 +1,52 @@
-from app.models import User, Equipment, Booking, UsageLog, HomePageConfig, Lab, UserRole, EquipmentStatus
+from app.models import User, Equipment, Booking, BookingStatus, UsageLog, HomePageConfig, Lab, UserRole, EquipmentStatus
+import sys
+from array import array
+from bisect import insort
+from collections import Counter, defaultdict
 from datetime import datetime
+from functools import cache
+from itertools import starmap
+from operator import attrgetter
+from typing import get_args
+from uuid import uuid4
 
 # --- MOCK DATA STORE (Singleton Pattern for In-Memory Database) ---
 
 BRAND_LOGO_URL = "/static/images/logo.png"
 
+BOOKING_STATUSES: tuple[str, ...] = get_args(BookingStatus)
+
+STATUS_TRANS = {
+    "AVAILABLE": "Sẵn sàng",
+    "BOOKED": "Đã đặt",
+    "IN_USE": "Đang dùng",
+    "BROKEN": "Hư hỏng",
+    "MAINTENANCE": "Bảo trì",
+    "LIQUIDATED": "Đã thanh lý",
+}
+STATUS_TRANS_BY_ENUM: dict[EquipmentStatus, str] = {st: STATUS_TRANS[st.value] for st in EquipmentStatus}
+
+# Mã số nhỏ cho từng trạng thái, dùng cho cột int8 trong DataStore
+EQUIPMENT_STATUSES: tuple[EquipmentStatus, ...] = tuple(EquipmentStatus)
+_EQ_STATUS_CODES: dict[EquipmentStatus, int] = {st: i for i, st in enumerate(EQUIPMENT_STATUSES)}
+
+def _session_year(session: dict) -> int | None:
+    date_str = session.get("date")
+    try:
+        return datetime.fromisoformat(date_str).year if date_str else None
+    except Exception:
+        return None
+
+
+# Mẫu dòng tóm tắt cho system prompt của trợ lý AI
+_EQUIP_LINE = "- {} (Mã: {}): Vị trí {}, Trạng thái: {}, Mô tả: {}".format
+_LAB_LINE = "- {} ({}): {}".format
+
+# Lấy nhiều thuộc tính trong một lần gọi (C-level) thay vì getattr từng trường
+_EQUIP_FIELDS = attrgetter("name", "code", "location", "status", "notes")
+_LAB_FIELDS = attrgetter("name", "locationCode", "description")
+
+
 class DataStore:
     def __init__(self):
         self.users: list[User] = [
@@ -56,10 +98,150 @@ class DataStore:
             visitorCount=15300
         )
 
+        # Chỉ mục theo id để tra cứu O(1) thay vì duyệt toàn bộ danh sách
+        self._users_by_id: dict[str, User] = {u.id: u for u in self.users}
+        self._equipment_by_id: dict[str, Equipment] = {e.id: e for e in self.equipment}
+        self._equipment_by_status: dict[str, list[Equipment]] = defaultdict(list)
+        for e in self.equipment:
+            self._equipment_by_status[e.status].append(e)
+        # Cột trạng thái dạng int8, cùng thứ tự với self.equipment, để đếm bằng Counter (C-level)
+        self._eq_status_arr = array("b", [_EQ_STATUS_CODES[e.status] for e in self.equipment])
+        # Khoa/bộ môn sử dụng: intern chuỗi một lần, lưu mã số nguyên theo cột
+        self._dept_ids: dict[str, int] = {}
+        self._dept_names: list[str] = []
+        self._eq_dept_codes = array("i", [self._dept_code(e.usingDepartment) for e in self.equipment])
+
+        # Các booking đã có nhật ký sử dụng, cập nhật dần qua add_log
+        self.logged_booking_ids: set[str] = {l.bookingId for l in self.logs if l.bookingId}
+
+        # Đợt kiểm kê theo id, kèm chỉ mục năm -> danh sách id (theo thứ tự tạo)
+        self.inventorySessions: dict[str, dict] = {}
+        self._sessions_by_year: dict[int, list[str]] = {}
+        # Số thứ tự tạo của từng đợt, để chèn đúng vị trí khi đổi năm
+        self._session_seq: dict[str, int] = {}
+        self._next_session_seq = 0
+
+        # Tóm tắt thiết bị / phòng lab cho trợ lý AI, tính lại khi dữ liệu thay đổi
+        self._equip_summary_cache: str | None = None
+        self._labs_summary_cache: str | None = None
+
     def get_user(self, user_id: str):
-        return next((u for u in self.users if u.id == user_id), None)
+        return self._users_by_id.get(user_id)
 
     def get_equipment(self, eq_id: str):
-        return next((e for e in self.equipment if e.id == eq_id), None)
+        return self._equipment_by_id.get(eq_id)
+
+    def add_user(self, user: User):
+        self.users.append(user)
+        self._users_by_id[user.id] = user
+        return user
+
+    def add_equipment(self, equipment: Equipment):
+        self.equipment.append(equipment)
+        self._equipment_by_id[equipment.id] = equipment
+        self._equipment_by_status[equipment.status].append(equipment)
+        self._eq_status_arr.append(_EQ_STATUS_CODES[equipment.status])
+        self._eq_dept_codes.append(self._dept_code(equipment.usingDepartment))
+        self._equip_summary_cache = None
+        return equipment
+
+    def equipment_with_status(self, status: str) -> list[Equipment]:
+        return self._equipment_by_status.get(status, [])
+
+    def _dept_code(self, dept: str | None) -> int:
+        dept = sys.intern(dept or "N/A")
+        code = self._dept_ids.get(dept)
+        if code is None:
+            code = self._dept_ids[dept] = len(self._dept_names)
+            self._dept_names.append(dept)
+        return code
+
+    def equipment_department_counts(self) -> dict[str, int]:
+        """Số thiết bị theo khoa/bộ môn sử dụng ("N/A" nếu chưa có)."""
+        names = self._dept_names
+        return {names[code]: n for code, n in Counter(self._eq_dept_codes).items()}
+
+    def equipment_status_counts(self) -> dict[EquipmentStatus, int]:
+        """Số thiết bị theo trạng thái (chỉ các trạng thái có thiết bị)."""
+        return {EQUIPMENT_STATUSES[code]: n for code, n in Counter(self._eq_status_arr).items()}
+
+    def add_log(self, log: UsageLog):
+        self.logs.append(log)
+        if log.bookingId:
+            self.logged_booking_ids.add(log.bookingId)
+        return log
+
+    def add_lab(self, lab: Lab):
+        self.labs.append(lab)
+        self._labs_summary_cache = None
+        return lab
+
+    def equip_summary(self) -> str:
+        if self._equip_summary_cache is None:
+            self._equip_summary_cache = "\n".join(
+                _EQUIP_LINE(name, code, loc, STATUS_TRANS_BY_ENUM.get(st, st), notes)
+                for name, code, loc, st, notes in map(_EQUIP_FIELDS, self.equipment)
+            )
+        return self._equip_summary_cache
+
+    def labs_summary(self) -> str:
+        if self._labs_summary_cache is None:
+            self._labs_summary_cache = "\n".join(starmap(_LAB_LINE, map(_LAB_FIELDS, self.labs)))
+        return self._labs_summary_cache
+
+    def inventory_sessions(self, year: int | None = None) -> list[dict]:
+        if year is None:
+            return list(self.inventorySessions.values())
+        return [self.inventorySessions[sid] for sid in self._sessions_by_year.get(year, [])]
+
+    def add_inventory_session(self, session: dict) -> dict | None:
+        """Thêm đợt kiểm kê; trả về None nếu id đã tồn tại (không ghi đè)."""
+        session_id = session.setdefault("id", f"inv-{uuid4().hex}")
+        if session_id in self.inventorySessions:
+            return None
+        self.inventorySessions[session_id] = session
+        self._session_seq[session_id] = self._next_session_seq
+        self._next_session_seq += 1
+        self._index_session_year(session_id, _session_year(session))
+        return session
+
+    def update_inventory_session(self, session_id: str, changes: dict) -> bool:
+        session = self.inventorySessions.get(session_id)
+        if session is None:
+            return False
+        # id là khóa của dict, không cho payload đổi id
+        changes = {k: v for k, v in changes.items() if k != "id"}
+        old_year = _session_year(session)
+        session.update(changes)
+        new_year = _session_year(session)
+        if new_year != old_year:
+            self._unindex_session_year(session_id, old_year)
+            self._index_session_year(session_id, new_year)
+        return True
+
+    def delete_inventory_session(self, session_id: str) -> bool:
+        session = self.inventorySessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._unindex_session_year(session_id, _session_year(session))
+        del self._session_seq[session_id]
+        return True
+
+    def _index_session_year(self, session_id: str, year: int | None):
+        if year is not None:
+            # Danh sách mỗi năm luôn sắp theo thứ tự tạo: chèn bằng bisect thay vì quét lại
+            insort(self._sessions_by_year.setdefault(year, []), session_id, key=self._session_seq.__getitem__)
+
+    def _unindex_session_year(self, session_id: str, year: int | None):
+        ids = self._sessions_by_year.get(year)
+        if ids and session_id in ids:
+            ids.remove(session_id)
+
+    def add_booking(self, booking: Booking):
+        self.bookings.append(booking)
+        return booking
 
-db = DataStore()
\ No newline at end of file
+@cache
+def get_db() -> DataStore:
+    """Singleton DataStore, chỉ khởi tạo (kèm các chỉ mục) ở lần truy cập đầu tiên."""
+    return DataStore()
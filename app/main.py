@@ -1,16 +1,27 @@
 from __future__ import annotations
 
+import itertools
 import os
-from datetime import datetime
-from typing import Optional, Any, Dict, List
+import re
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from operator import attrgetter
+from uuid import UUID
+from typing import Optional, Any, Callable, Dict, List
 
 from fastapi import FastAPI, Request, Form, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, ORJSONResponse, HTMLResponse, StreamingResponse
 
-from app.models import User, Booking, UsageLog
-from app.data import db, BRAND_LOGO_URL
+import orjson
+from pydantic import ValidationError
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateError
+
+from app.models import User, Booking, ROLE_BITS, ADMIN_BIT, STAFF_MASK
+from app.data import get_db, BRAND_LOGO_URL, BOOKING_STATUSES
 
 # === Google GenAI (optional) ===
 try:
@@ -24,32 +35,79 @@ except ImportError:
     GOOGLE_API_KEY = None
 
 # === Constants ===
-# Giả sử STATUS_TRANS được định nghĩa như sau (bổ sung nếu chưa có)
-STATUS_TRANS = {
-    "AVAILABLE": "Sẵn sàng",
-    "BOOKED": "Đã đặt",
-    "IN_USE": "Đang dùng",
-    "BROKEN": "Hư hỏng",
-    "MAINTENANCE": "Bảo trì",
-    "LIQUIDATED": "Đã thanh lý",
-}
+HISTORY_STATUSES = ("COMPLETED", "CANCELLED", "REJECTED")
+
+VISIT_FLUSH_EVERY = 100
+_visit_counter = itertools.count(1)
+_last_visit = 0  # số thứ tự lượt truy cập gần nhất, dùng tính phần chưa ghi vào model
+
+_BOOKING_FIELDS = attrgetter("id", "userId", "equipmentId", "status")
+_EQUIP_NAME_CODE = attrgetter("name", "code")
 
 # === App setup ===
-app = FastAPI()
+# Template được compile một lần và cache trong bộ nhớ; chỉ bật auto_reload khi dev
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD") == "1"
+
+templates = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader("templates", followlinks=False),
+        autoescape=True,
+        auto_reload=TEMPLATES_AUTO_RELOAD,
+        cache_size=-1,
+        bytecode_cache=FileSystemBytecodeCache(),
+    )
+)
+
+
+# Giá trị dùng chung cho mọi template
+templates.env.globals["brand_logo"] = BRAND_LOGO_URL
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warmup: compile toàn bộ template khi khởi động thay vì ở request đầu tiên
+    for name in templates.env.list_templates():
+        try:
+            templates.env.get_template(name)
+        except TemplateError as e:
+            print("Template Error:", name, e)
+    yield
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# File tĩnh có hash trong tên (vd. main.3f2a9c1b.js) không bao giờ đổi nội dung.
+# Hash phải có ít nhất một chữ a-f để không nhầm với tên có ngày (vd. report.20240101.pdf).
+_HASHED_ASSET = re.compile(r"\.(?=[0-9]*[a-f])[0-9a-f]{8,}\.\w+$")
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles kèm Cache-Control immutable cho asset có hash; file khác giữ mặc định (ETag/Last-Modified)."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if _HASHED_ASSET.search(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
 
 
 # =========================================================
 # Helpers: auth / context
 # =========================================================
 
+_UNSET = object()
+
+
 def get_current_user(request: Request) -> Optional[User]:
-    user_id = request.cookies.get("user_id")
-    if not user_id:
-        return None
-    return db.get_user(user_id)
+    """Lấy user từ cookie, cache vào request.state cho cả vòng đời request."""
+    user = getattr(request.state, "user", _UNSET)
+    if user is _UNSET:
+        user_id = request.cookies.get("user_id")
+        user = get_db().get_user(user_id) if user_id else None
+        request.state.user = user
+    return user
 
 
 def redirect_to(path: str) -> RedirectResponse:
@@ -66,7 +124,7 @@ def require_staff(request: Request) -> Optional[RedirectResponse]:
     user = get_current_user(request)
     if not user:
         return redirect_to("/login")
-    if user.role not in ["ADMIN", "STAFF"]:
+    if not (ROLE_BITS[user.role] & STAFF_MASK):
         return redirect_to("/")
     return None
 
@@ -75,20 +133,71 @@ def require_admin(request: Request) -> Optional[RedirectResponse]:
     user = get_current_user(request)
     if not user:
         return redirect_to("/login")
-    if user.role != "ADMIN":
+    if not (ROLE_BITS[user.role] & ADMIN_BIT):
         return redirect_to("/")
     return None
 
 
-def _to_dict(x: Any) -> Dict[str, Any]:
-    """Chuyển object sang dict, hỗ trợ Pydantic v1 (.dict()) và v2 (.model_dump())."""
+def _resolve_dumper(x: Any) -> Callable[[Any], Dict[str, Any]]:
+    """Dò hasattr một lần cho class của x, trả về hàm chuyển sang dict tương ứng."""
+    cls = type(x)
+    if getattr(cls, "__pydantic_complete__", False) and hasattr(cls, "__pydantic_serializer__"):
+        # Pydantic v2: gọi thẳng serializer (Rust) của class, bỏ qua lớp model_dump()
+        return cls.__pydantic_serializer__.to_python
     if hasattr(x, "model_dump"):
-        return x.model_dump()
+        return cls.model_dump
     if hasattr(x, "dict"):
-        return x.dict()
+        return cls.dict
     if hasattr(x, "__dict__"):
-        return dict(x.__dict__)
-    return dict(x)
+        return lambda o: dict(o.__dict__)
+    return dict
+
+
+_dump_for_type: Dict[type, Callable[[Any], Dict[str, Any]]] = {}
+
+
+def _to_dict(x: Any) -> Dict[str, Any]:
+    """Chuyển object sang dict, hỗ trợ Pydantic v1 (.dict()) và v2 (.model_dump())."""
+    cls = type(x)
+    fn = _dump_for_type.get(cls)
+    if fn is None:
+        fn = _dump_for_type[cls] = _resolve_dumper(x)
+    return fn(x)
+
+
+def _default(obj: Any) -> Any:
+    """Bổ sung cho orjson các kiểu nó không tự xử lý."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def json_response(payload: Any) -> Response:
+    """Serialize trực tiếp bằng orjson, bỏ qua jsonable_encoder của FastAPI."""
+    return Response(content=orjson.dumps(payload, default=_default), media_type="application/json")
+
+
+async def _iter_json_list(items: List[Any]):
+    yield b'{"success":true,"data":['
+    sep = b""
+    for x in items:
+        yield sep + orjson.dumps(_to_dict(x), default=_default)
+        sep = b","
+    yield b"]}"
+
+
+def json_list_stream_response(items: List[Any]) -> StreamingResponse:
+    """Trả {"success": true, "data": [...]} theo từng phần tử, không dựng cả payload trong bộ nhớ."""
+    # Snapshot danh sách để việc thêm/xóa trong lúc stream không ảnh hưởng kết quả
+    return StreamingResponse(_iter_json_list(list(items)), media_type="application/json")
 
 
 def user_to_dict(u: Optional[User]) -> Dict[str, Any]:
@@ -97,41 +206,56 @@ def user_to_dict(u: Optional[User]) -> Dict[str, Any]:
     return _to_dict(u)
 
 
+def current_user_dict(request: Request) -> Dict[str, Any]:
+    """user_to_dict của user hiện tại, chỉ serialize một lần mỗi request."""
+    user_dict = getattr(request.state, "user_dict", None)
+    if user_dict is None:
+        user_dict = request.state.user_dict = user_to_dict(get_current_user(request))
+    return user_dict
+
+
+def record_visit(home_cfg) -> None:
+    """Đếm một lượt truy cập; chỉ ghi vào model mỗi VISIT_FLUSH_EVERY lượt."""
+    global _last_visit
+    # next() trên itertools.count là atomic, không mất lượt khi chạy đồng thời
+    n = next(_visit_counter)
+    if n % VISIT_FLUSH_EVERY == 0:
+        home_cfg.visitorCount += VISIT_FLUSH_EVERY
+    _last_visit = n
+
+
+def visit_count(home_cfg) -> int:
+    """Số lượt truy cập hiển thị: phần đã ghi vào model cộng phần đang chờ ghi."""
+    return getattr(home_cfg, "visitorCount", 0) + _last_visit % VISIT_FLUSH_EVERY
+
+
 def common_context(request: Request) -> dict:
-    user = get_current_user(request)
+    # brand_logo là Jinja global (xem phần App setup), không cần gắn lại mỗi request
+    db = get_db()
+    home_cfg = getattr(db, "home_config", None)
     return {
         "request": request,
-        "current_user": user,
-        "current_user_json": user_to_dict(user),
-        "home_config": getattr(db, "home_config", None),
-        "brand_logo": BRAND_LOGO_URL,
-        "visit_count": getattr(getattr(db, "home_config", None), "visitorCount", 0),
+        "current_user": get_current_user(request),
+        "current_user_json": current_user_dict(request),
+        "home_config": home_cfg,
+        "visit_count": visit_count(home_cfg),
         "path": request.url.path,
         "now": datetime.now(),
     }
 
 
-# =========================================================
-# Middleware
-# =========================================================
-
-@app.middleware("http")
-async def add_context_middleware(request: Request, call_next):
-    response = await call_next(request)
-    return response
-
-
 # =========================================================
 # Pages: Core
 # =========================================================
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
+    db = get_db()
     ctx = common_context(request)
     home_cfg = getattr(db, "home_config", None)
     if home_cfg and hasattr(home_cfg, "visitorCount"):
-        home_cfg.visitorCount += 1
-        ctx["visit_count"] = home_cfg.visitorCount
+        record_visit(home_cfg)
+        ctx["visit_count"] = visit_count(home_cfg)
 
     featured_ids = getattr(home_cfg, "featuredEquipmentIds", []) if home_cfg else []
     equipment_list = getattr(db, "equipment", [])
@@ -158,12 +282,13 @@ async def login_page(request: Request):
 
 @app.post("/api/login")
 async def login_api(response: Response, user_id: str = Form(...), password: str = Form(...)):
+    db = get_db()
     user = db.get_user(user_id)
     if user and user.password == password and not user.isLocked:
-        resp = JSONResponse(content={"success": True, "redirect": "/"})
+        resp = ORJSONResponse(content={"success": True, "redirect": "/"})
         resp.set_cookie(key="user_id", value=user.id, httponly=True, samesite="lax")
         return resp
-    return JSONResponse(content={"success": False, "message": "Sai thông tin đăng nhập"}, status_code=401)
+    return ORJSONResponse(content={"success": False, "message": "Sai thông tin đăng nhập"}, status_code=401)
 
 
 @app.get("/logout")
@@ -223,15 +348,15 @@ async def user_profile_page(request: Request):
 
 @app.get("/equipment", response_class=HTMLResponse)
 async def equipment_list(request: Request, search: str = "", status: str = "ALL"):
+    db = get_db()
     ctx = common_context(request)
-    items = list(getattr(db, "equipment", []))
+    items = db.equipment if status == "ALL" else db.equipment_with_status(status)
 
     if search:
         s = search.lower()
-        items = [e for e in items if s in getattr(e, "name", "").lower() or s in getattr(e, "code", "").lower()]
-
-    if status != "ALL":
-        items = [e for e in items if getattr(e, "status", None) == status]
+        items = [e for e in items if s in e.name_lower or s in e.code_lower]
+    else:
+        items = list(items)
 
     ctx.update(
         {
@@ -246,6 +371,7 @@ async def equipment_list(request: Request, search: str = "", status: str = "ALL"
 
 @app.get("/equipment/{id}", response_class=HTMLResponse)
 async def equipment_detail(request: Request, id: str):
+    db = get_db()
     ctx = common_context(request)
     item = db.get_equipment(id)
     if not item:
@@ -268,23 +394,16 @@ async def equipment_detail(request: Request, id: str):
 
 @app.get("/equipment-stats", response_class=HTMLResponse)
 async def equipment_stats_page(request: Request):
+    db = get_db()
     r = require_staff(request)
     if r:
         return r
 
     ctx = common_context(request)
-    equipment_list = list(getattr(db, "equipment", []))
-
-    total = len(equipment_list)
-    by_status: Dict[str, int] = {}
-    by_department: Dict[str, int] = {}
-
-    for e in equipment_list:
-        st = getattr(e, "status", "UNKNOWN") or "UNKNOWN"
-        by_status[st] = by_status.get(st, 0) + 1
 
-        dept = getattr(e, "usingDepartment", None) or "N/A"
-        by_department[dept] = by_department.get(dept, 0) + 1
+    total = len(db.equipment)
+    by_status = db.equipment_status_counts()
+    by_department = db.equipment_department_counts()
 
     ctx.update(
         {
@@ -303,72 +422,80 @@ async def equipment_stats_page(request: Request):
 
 @app.get("/bookings", response_class=HTMLResponse)
 async def bookings_page(request: Request):
+    db = get_db()
     ctx = common_context(request)
     user = ctx["current_user"]
     if not user:
         return redirect_to("/login")
 
-    bookings = list(getattr(db, "bookings", []))
-    if user.role not in ["ADMIN", "STAFF"]:
-        bookings = [b for b in bookings if getattr(b, "userId", None) == user.id]
-
-    enhanced = []
-    for b in bookings:
-        eq = db.get_equipment(getattr(b, "equipmentId", ""))
-        enhanced.append({
-            **_to_dict(b),
-            "equipmentName": getattr(eq, "name", "Unknown") if eq else "Unknown",
-            "equipmentCode": getattr(eq, "code", "") if eq else "",
-        })
-
-    logs = list(getattr(db, "logs", []))
-    logged_booking_ids = {getattr(l, "bookingId") for l in logs if getattr(l, "bookingId")}
+    own_only = None if ROLE_BITS[user.role] & STAFF_MASK else user.id
+    logged_booking_ids = db.logged_booking_ids
 
     active_tab = request.query_params.get("tab", "PENDING")
     selected_year = int(request.query_params.get("year", datetime.now().year))
 
-    def filter_by_tab(bookings, tab, logged_ids, year=None):
-        if tab == "PENDING":
-            return [b for b in bookings if b.get("status") == "PENDING"]
-        elif tab == "APPROVED":
-            return [b for b in bookings if b.get("status") == "APPROVED"]
-        elif tab == "ACTIVE":
-            return [b for b in bookings if b.get("status") == "ACTIVE"]
-        elif tab == "WAITING_LOG":
-            return [b for b in bookings if b.get("status") == "COMPLETED" and b.get("id") not in logged_ids]
-        elif tab == "HISTORY":
-            filtered = [b for b in bookings if b.get("status") in ["COMPLETED", "CANCELLED", "REJECTED"]]
-            if year:
-                filtered = [b for b in filtered if datetime.fromisoformat(b["startTime"]).year == year]
-            return filtered
-        return bookings
-
-    filtered_bookings = filter_by_tab(enhanced, active_tab, logged_booking_ids, selected_year)
-
-    all_logged_ids = logged_booking_ids
+    # Một lượt duy nhất: lọc theo người dùng, bổ sung thông tin thiết bị, gom theo
+    # trạng thái, năm lịch sử và danh sách chờ nhật ký.
+    enhanced: List[Dict[str, Any]] = []
+    by_status: Dict[str, List[Dict[str, Any]]] = {st: [] for st in BOOKING_STATUSES}
+    history: List[Dict[str, Any]] = []
+    waiting_log: List[Dict[str, Any]] = []
+    years_set = set()
+    eq_info: Dict[str, tuple] = {}
+    for b in db.bookings:
+        booking_id, user_id, equipment_id, status = _BOOKING_FIELDS(b)
+        if own_only is not None and user_id != own_only:
+            continue
+        info = eq_info.get(equipment_id)
+        if info is None:
+            eq = db.get_equipment(equipment_id)
+            info = eq_info[equipment_id] = _EQUIP_NAME_CODE(eq) if eq else ("Unknown", "")
+        item = _to_dict(b)
+        item["equipmentName"], item["equipmentCode"] = info
+        enhanced.append(item)
+        by_status[status].append(item)
+        if status in HISTORY_STATUSES:
+            year = b.start_year
+            years_set.add(year)
+            if year == selected_year:
+                history.append(item)
+        if status == "COMPLETED" and booking_id not in logged_booking_ids:
+            waiting_log.append(item)
+
+    tabs = {
+        "PENDING": by_status["PENDING"],
+        "APPROVED": by_status["APPROVED"],
+        "ACTIVE": by_status["ACTIVE"],
+        "WAITING_LOG": waiting_log,
+        "HISTORY": history,
+    }
+    filtered_bookings = tabs.get(active_tab, enhanced)
+
     ctx.update({
         "page_title": "Booking List",
         "bookings": enhanced,
         "filtered_bookings": filtered_bookings,
         "active_tab": active_tab,
         "selected_history_year": selected_year,
-        "history_years": sorted({datetime.fromisoformat(b["startTime"]).year for b in enhanced if b.get("status") in ["COMPLETED", "CANCELLED", "REJECTED"]}, reverse=True) or [datetime.now().year],
-        "pending_count": len([b for b in enhanced if b.get("status") == "PENDING"]),
-        "approved_count": len([b for b in enhanced if b.get("status") == "APPROVED"]),
-        "active_count": len([b for b in enhanced if b.get("status") == "ACTIVE"]),
-        "waiting_log_count": len([b for b in enhanced if b.get("status") == "COMPLETED" and b.get("id") not in all_logged_ids]),
-        "history_count": len([b for b in enhanced if b.get("status") in ["COMPLETED", "CANCELLED", "REJECTED"]]),
+        "history_years": sorted(years_set, reverse=True) or [datetime.now().year],
+        "pending_count": len(by_status["PENDING"]),
+        "approved_count": len(by_status["APPROVED"]),
+        "active_count": len(by_status["ACTIVE"]),
+        "waiting_log_count": len(waiting_log),
+        "history_count": sum(len(by_status[st]) for st in HISTORY_STATUSES),
     })
     return templates.TemplateResponse("bookings.html", ctx)
 
 
 @app.post("/api/bookings/create")
 async def create_booking(request: Request):
+    db = get_db()
     data = await request.json()
-    new_booking = Booking(**data)
-    if not hasattr(db, "bookings"):
-        db.bookings = []
-    db.bookings.append(new_booking)
+    try:
+        new_booking = Booking(**data)
+    except ValidationError:
+        return ORJSONResponse({"success": False, "message": "Dữ liệu đặt lịch không hợp lệ"}, status_code=400)
+    db.add_booking(new_booking)
     return {"success": True}
 
 
@@ -418,6 +545,7 @@ async def qr_scanner_alias(request: Request):
 
 @app.get("/usage-logs", response_class=HTMLResponse)
 async def usage_log_list_page(request: Request):
+    db = get_db()
     r = require_staff(request)
     if r:
         return r
@@ -432,11 +560,12 @@ async def usage_log_list_page(request: Request):
 
 @app.get("/inventory", response_class=HTMLResponse)
 async def inventory_list_page(request: Request):
+    db = get_db()
     r = require_staff(request)
     if r:
         return r
     ctx = common_context(request)
-    sessions = getattr(db, "inventorySessions", [])
+    sessions = db.inventory_sessions()
     ctx.update({"page_title": "Inventory", "inventory_sessions": sessions})
     return templates.TemplateResponse("inventory.html", ctx)
 
@@ -447,6 +576,7 @@ async def inventory_list_page(request: Request):
 
 @app.get("/admin", response_class=HTMLResponse)
 async def admin_panel(request: Request):
+    db = get_db()
     r = require_admin(request)
     if r:
         return r
@@ -472,84 +602,51 @@ async def admin_panel_alias(request: Request):
 # APIs: Inventory (CRUD)
 # =========================================================
 
-def _ensure_inventory_store():
-    if not hasattr(db, "inventorySessions") or db.inventorySessions is None:
-        db.inventorySessions = []
-
-
 @app.get("/api/inventory/sessions")
 async def api_inventory_sessions(request: Request, year: Optional[int] = None):
+    db = get_db()
     r = require_staff(request)
     if r:
-        return JSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
-
-    _ensure_inventory_store()
-    sessions = db.inventorySessions
+        return ORJSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
 
-    if year is not None:
-        filtered = []
-        for s in sessions:
-            date_str = s.get("date") if isinstance(s, dict) else getattr(s, "date", None)
-            try:
-                y = datetime.fromisoformat(date_str).year if date_str else None
-            except Exception:
-                y = None
-            if y == year:
-                filtered.append(s)
-        sessions = filtered
-
-    return {"success": True, "data": sessions}
+    sessions = db.inventory_sessions(year)
+    return json_response({"success": True, "data": sessions})
 
 
 @app.post("/api/inventory/sessions")
 async def api_inventory_create_session(request: Request):
+    db = get_db()
     r = require_staff(request)
     if r:
-        return JSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
+        return ORJSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
 
     payload = await request.json()
-    _ensure_inventory_store()
-    db.inventorySessions.append(payload)
+    if db.add_inventory_session(payload) is None:
+        return ORJSONResponse({"success": False, "message": "Mã đợt kiểm kê đã tồn tại"}, status_code=409)
     return {"success": True, "data": payload}
 
 
 @app.put("/api/inventory/sessions/{session_id}")
 async def api_inventory_update_session(request: Request, session_id: str):
+    db = get_db()
     r = require_staff(request)
     if r:
-        return JSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
+        return ORJSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
 
     payload = await request.json()
-    _ensure_inventory_store()
-
-    updated = False
-    new_list = []
-    for s in db.inventorySessions:
-        sid = s.get("id") if isinstance(s, dict) else getattr(s, "id", None)
-        if sid == session_id and isinstance(s, dict):
-            new_list.append({**s, **payload})
-            updated = True
-        else:
-            new_list.append(s)
-
-    db.inventorySessions = new_list
+    updated = db.update_inventory_session(session_id, payload)
     return {"success": True, "updated": updated}
 
 
 @app.delete("/api/inventory/sessions/{session_id}")
 async def api_inventory_delete_session(request: Request, session_id: str):
+    db = get_db()
     r = require_staff(request)
     if r:
-        return JSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
-
-    _ensure_inventory_store()
+        return ORJSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
 
-    before = len(db.inventorySessions)
-    db.inventorySessions = [
-        s for s in db.inventorySessions
-        if (s.get("id") if isinstance(s, dict) else getattr(s, "id", None)) != session_id
-    ]
-    return {"success": True, "deleted": (before - len(db.inventorySessions))}
+    deleted = db.delete_inventory_session(session_id)
+    return {"success": True, "deleted": int(deleted)}
 
 
 # =========================================================
@@ -560,41 +657,42 @@ async def api_inventory_delete_session(request: Request, session_id: str):
 async def api_me(request: Request):
     user = get_current_user(request)
     if not user:
-        return JSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
-    return {"success": True, "data": _to_dict(user)}
+        return ORJSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
+    return json_response({"success": True, "data": current_user_dict(request)})
 
 
 @app.get("/api/equipment")
 async def api_equipment_list(request: Request):
+    db = get_db()
     r = require_login(request)
     if r:
-        return JSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
+        return ORJSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
 
     items = getattr(db, "equipment", [])
-    out = [_to_dict(e) for e in items]
-    return {"success": True, "data": out}
+    return json_list_stream_response(items)
 
 
 @app.get("/api/users")
 async def api_users(request: Request):
+    db = get_db()
     r = require_staff(request)
     if r:
-        return JSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
+        return ORJSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
 
     users = getattr(db, "users", [])
     out = [_to_dict(u) for u in users]
-    return {"success": True, "data": out}
+    return json_response({"success": True, "data": out})
 
 
 @app.get("/api/usage-logs")
 async def api_usage_logs(request: Request):
+    db = get_db()
     r = require_staff(request)
     if r:
-        return JSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
+        return ORJSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
 
     logs = getattr(db, "logs", [])
-    out = [_to_dict(l) for l in logs]
-    return {"success": True, "data": out}
+    return json_list_stream_response(logs)
 
 
 # =========================================================
@@ -603,28 +701,22 @@ async def api_usage_logs(request: Request):
 
 @app.post("/api/ai/chat")
 async def ai_chat_api(request: Request):
+    db = get_db()
     user = get_current_user(request)
     if not user:
-        return JSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
+        return ORJSONResponse({"success": False, "message": "Unauthorized"}, status_code=401)
 
     if not GOOGLE_API_KEY:
-        return JSONResponse({"success": False, "message": "AI chưa được cấu hình."}, status_code=500)
+        return ORJSONResponse({"success": False, "message": "AI chưa được cấu hình."}, status_code=500)
 
     try:
         data = await request.json()
         user_message = data.get("message", "").strip()
         if not user_message:
-            return JSONResponse({"success": False, "message": "Empty message"}, status_code=400)
-
-        equip_summary = "\n".join([
-            f"- {getattr(e, 'name', 'N/A')} (Mã: {getattr(e, 'code', 'N/A')}): Vị trí {getattr(e, 'location', 'N/A')}, Trạng thái: {STATUS_TRANS.get(getattr(e, 'status', ''), getattr(e, 'status', ''))}, Mô tả: {getattr(e, 'notes', 'Không có')}"
-            for e in getattr(db, "equipment", [])
-        ])
+            return ORJSONResponse({"success": False, "message": "Empty message"}, status_code=400)
 
-        lab_summary = "\n".join([
-            f"- {getattr(l, 'name', 'N/A')} ({getattr(l, 'locationCode', 'N/A')}): {getattr(l, 'description', '')}"
-            for l in getattr(db, "labs", [])
-        ])
+        equip_summary = db.equip_summary()
+        lab_summary = db.labs_summary()
 
         system_prompt = f"""
 Bạn là trợ lý AI thông minh cho hệ thống quản lý thiết bị phòng thí nghiệm "SciEquip" của Trường Đại học Y Dược Cần Thơ.
@@ -660,4 +752,4 @@ LƯU Ý: Bạn chỉ là trợ lý tra cứu, bạn không thể trực tiếp t
 
     except Exception as e:
         print("AI Error:", e)
-        return JSONResponse({"success": False, "message": "Lỗi máy chủ AI"}, status_code=500)
\ No newline at end of file
+        return ORJSONResponse({"success": False, "message": "Lỗi máy chủ AI"}, status_code=500)
\ No newline at end of file
@@ -1,12 +1,24 @@
-from pydantic import BaseModel
-from typing import List, Optional, Literal, Dict, Any
+from pydantic import BaseModel, field_validator
+from typing import List, Optional, Literal
 from enum import Enum
+from functools import cached_property
+from datetime import datetime
 
 class UserRole(str, Enum):
     ADMIN = 'ADMIN'
     STAFF = 'STAFF'
     STUDENT = 'STUDENT'
 
+# Vai trò vẫn lưu dạng chuỗi (template/JSON dùng), bit chỉ dùng cho kiểm tra quyền.
+# Dùng int thường: phép & trên IntFlag chạy bằng Python, chậm hơn so sánh chuỗi.
+ROLE_BITS = {
+    UserRole.STUDENT: 1,
+    UserRole.STAFF: 2,
+    UserRole.ADMIN: 4,
+}
+ADMIN_BIT = 4
+STAFF_MASK = 6  # STAFF | ADMIN
+
 class EquipmentStatus(str, Enum):
     AVAILABLE = 'AVAILABLE'
     IN_USE = 'IN_USE'
@@ -62,6 +74,17 @@ class Equipment(BaseModel):
     sops: List[SOP] = []
     isRestricted: Optional[bool] = False
 
+    # Chuỗi viết thường dùng cho tìm kiếm, tính một lần rồi cache
+    @cached_property
+    def name_lower(self) -> str:
+        return self.name.lower()
+
+    @cached_property
+    def code_lower(self) -> str:
+        return self.code.lower()
+
+BookingStatus = Literal['PENDING', 'APPROVED', 'ACTIVE', 'COMPLETED', 'CANCELLED', 'REJECTED']
+
 class Booking(BaseModel):
     id: str
     equipmentId: str
@@ -73,13 +96,29 @@ class Booking(BaseModel):
     startTime: str
     endTime: str
     purpose: str
-    status: Literal['PENDING', 'APPROVED', 'ACTIVE', 'COMPLETED', 'CANCELLED', 'REJECTED']
+    status: BookingStatus
     sopConfirmed: bool = False
     approverName: Optional[str] = None
     rejectionReason: Optional[str] = None
     createdAt: str
     updatedAt: Optional[str] = None
 
+    @field_validator('startTime')
+    @classmethod
+    def _check_start_time(cls, v: str) -> str:
+        # Từ chối startTime không đúng ISO ngay khi tạo (ValidationError), thay vì lỗi khi hiển thị
+        datetime.fromisoformat(v)
+        return v
+
+    @cached_property
+    def start_dt(self) -> datetime:
+        # Parse startTime một lần, tránh fromisoformat lặp lại khi lọc lịch sử
+        return datetime.fromisoformat(self.startTime)
+
+    @property
+    def start_year(self) -> int:
+        return self.start_dt.year
+
 class UsageLog(BaseModel):
     id: str
     bookingId: Optional[str] = None